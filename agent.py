@@ -1,10 +1,10 @@
 import logging
 import os
 import asyncio
+import functools
 import sys
-import requests
-from dotenv import load_dotenv
-from memu import MemuClient
+from dataclasses import dataclass, field
+import httpx
 from livekit import agents
 from livekit.agents import (
     Agent,
@@ -12,224 +12,207 @@ from livekit.agents import (
     AgentSession,
     inference,
     JobContext,
+    JobProcess,
     room_io,
 )
 from livekit.plugins import silero
 from livekit.plugins import openai
 from livekit.plugins import deepgram
 
+# 导入 memu_utils 时会从 .env 加载环境变量并初始化 MemU 客户端
+from memu_utils import (
+    aretrieve_user_memories,
+    build_memory_context,
+    inject_memory_context,
+    memu_save_consumer,
+    new_http_client,
+    SAVE_QUEUE_SENTINEL,
+)
+
 logger = logging.getLogger("guma-agent")
 
 #OPENAI-API
-load_dotenv(override=True)
-api_key = os.getenv("OPENAI_APIKEY")
+# 环境变量在导入时读取一次；必需项缺失时直接报错，避免每个会话启动后才失败
+REQUIRED_ENV_VARS = ("OPENAI_APIKEY", "DEEPGRAM_API_KEY")
+_missing_env = [name for name in REQUIRED_ENV_VARS if not os.getenv(name)]
+if _missing_env:
+    raise RuntimeError(f"缺少必需的环境变量: {', '.join(_missing_env)}（请在 .env 中配置）")
+
+api_key = os.environ["OPENAI_APIKEY"]
 base_url = os.getenv("BASE_URL")
-memu_api_key = os.getenv("MEMU_API_KEY")  # MemU API 密钥
-MEMU_API_BASE = "https://api.memu.so/api/v1"
-deepgram_api_key = os.getenv("DEEPGRAM_API_KEY")  # Deepgram API 密钥
+deepgram_api_key = os.environ["DEEPGRAM_API_KEY"]  # Deepgram API 密钥
 # print(f"OPENAI_APIKEY: {api_key}")
 # print(f"BASE_URL: {base_url}")
 
-# 初始化 MemU 客户端
-if memu_api_key:
-    memu_client = MemuClient(
-        base_url="https://api.memu.so",
-        api_key=memu_api_key
-    )
-    logger.info("[MEMU] ✅ MemU 客户端初始化成功")
-else:
-    memu_client = None
-    logger.warning("[MEMU] ⚠️  MemU API 密钥未设置，记忆功能将被禁用")
+# 基础系统提示词：模块级常量并驻留，所有会话共享同一对象，且作为稳定前缀保证跨会话逐字节一致
+BASE_INSTRUCTIONS = sys.intern(
+    """你是一个有用的语音人工智能助手。你热心地帮助用户解答他们的问题，从你广博的知识中提供信息。
+你的回答简洁明了，没有任何复杂的格式或标点符号，包括表情符号、星号或其他符号。你好奇、友善，而且有幽默感。"""
+)
 
 # ============================================================================
-# MemU 记忆层功能函数
+# 对话轮次累积
 # ============================================================================
-def retrieve_user_memories(user_id: str, agent_id: str):
-    """
-    从 MemU 检索用户的历史记忆
-    参数:
-        user_id: 用户唯一标识符
-        agent_id: 代理唯一标识符
-    返回:
-        dict: 包含记忆分类的字典，如果失败则返回空字典
+
+def content_to_text(content: list) -> str:
     """
-    if not memu_client:
-        logger.warning("[MEMU] ⚠️  客户端未初始化，跳过记忆检索")
-        return {'categories': []}
+    将 ChatMessage.content 列表合并为文本
     
-    try:
-        logger.info("[MEMU] 🔍 开始检索用户记忆...")
-        logger.info(f"[MEMU]   用户 ID: {user_id}")
-        logger.info(f"[MEMU]   代理 ID: {agent_id}")
+    字符串项直接保留，其他项取其 text 属性；图片、工具调用等没有文本的项以及空字符串被跳过
+    """
+    # 常见情况：只有一个字符串项，直接返回，无需遍历拼接
+    if len(content) == 1 and isinstance(content[0], str):
+        return content[0]
+    parts = []
+    skipped = 0
+    for c in content:
+        text = c if isinstance(c, str) else getattr(c, "text", None)
+        if text and isinstance(text, str):
+            parts.append(text)
+        elif not isinstance(c, str):
+            skipped += 1
+    if skipped:
+        logger.debug("[LiveKit] 跳过 %d 个无文本的消息内容项", skipped)
+    return "".join(parts)
+
+class TurnAccumulator:
+    """将 conversation_item_added 事件中的用户/助手消息配对为完整的对话轮次"""
+    __slots__ = ("user", "count")
+
+    def __init__(self) -> None:
+        self.user = None  # 等待助手回复的用户消息
+        self.count = 0  # 已完成的对话轮次
+
+    def add(self, role: str, content: str):
+        """
+        加入一条消息
         
-        memories = memu_client.retrieve_default_categories(
-            user_id=user_id,
-            agent_id=agent_id
+        返回:
+            list | None: 助手回复与此前的用户消息配对成功时返回该轮 [user, assistant] 消息，否则返回 None
+        """
+        if role == "user":
+            self.user = content
+            return None
+        if role != "assistant" or not self.user:
+            return None
+        pair = [
+            {"role": "user", "content": self.user},
+            {"role": "assistant", "content": content}
+        ]
+        self.user = None
+        self.count += 1
+        return pair
+
+
+@dataclass
+class SessionState:
+    """单个会话的 MemU 保存状态，事件处理函数通过 functools.partial 绑定到该对象"""
+    user_id: str
+    agent_id: str
+    turns: TurnAccumulator = field(default_factory=TurnAccumulator)
+    # 对话轮次放入队列，由单个后台消费者按批次串行保存，保证顺序并限制并发
+    save_queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=64))
+    refresh_tasks: set = field(default_factory=set)  # 保存成功后启动的记忆刷新任务，会话关闭时取消
+    save_consumer: asyncio.Task = None
+    stop_task: asyncio.Task = None  # 停止消费者的任务，会话关闭事件与任务关闭回调共用
+    http: httpx.AsyncClient = field(default_factory=new_http_client)  # 本会话的 MemU HTTP 客户端
+
+    def start_save_consumer(self, assistant) -> None:
+        """启动后台保存消费者，提交成功后刷新 assistant 的记忆消息"""
+        self.save_consumer = asyncio.create_task(
+            memu_save_consumer(self.save_queue, self.user_id, self.agent_id, assistant, self.refresh_tasks, self.http)
         )
-        categories = extract_categories(memories)
-        if categories:
-            category_count = len(categories)
-            logger.info(f"[MEMU] ✅ 成功检索到 {category_count} 个记忆分类")
-            for idx, category in enumerate(categories, 1):
-                category_name = extract_value(category, 'name') or '未知分类'
-                summary_val = extract_value(category, 'summary') or ''
-                summary_preview = (summary_val[:50] + '...') if summary_val else '无摘要'
-                logger.info(f"[MEMU]   分类 {idx}: {category_name} (摘要: {summary_preview})")
-        else:
-            logger.info("[MEMU] ℹ️  未找到历史记忆（新用户或首次对话）")
-        
-        return memories
-    except Exception as error:
-        logger.error(f"[MEMU] ❌ 检索记忆时发生错误: {error}")
-        logger.error(f"[MEMU]   错误类型: {type(error).__name__}")
-        return {'categories': []}
 
+    def cancel_refresh_tasks(self) -> None:
+        for task in list(self.refresh_tasks):
+            task.cancel()
 
-def build_system_prompt_with_memories(base_instructions: str, memories: dict) -> str:
-    """
-    将记忆信息整合到系统提示词中
-    
-    参数:
-        base_instructions: 基础系统提示词
-        memories: 从 MemU 检索的记忆字典
-    
-    返回:
-        str: 包含记忆信息的完整系统提示词
-    """
-    system_prompt = base_instructions
-    logger.info(f"system_prompt:{system_prompt}")
-    
-    categories = extract_categories(memories)
-    if categories:
-        memory_context = "\n\n以下是关于用户的信息：\n\n"
-        added_categories = 0
-        for category in categories:
-            category_summary = extract_value(category, 'summary')
-            if category_summary:
-                category_name = extract_value(category, 'name') or '未知分类'
-                memory_context += f"**{category_name}:** {category_summary}\n\n"
-                added_categories += 1
-        if added_categories > 0:
-            system_prompt += memory_context
-            logger.info(f"[MEMU] 📝 已将 {added_categories} 个记忆分类添加到系统提示词")
-            logger.info(f"new_system_prompt:{system_prompt}")
-        else:
-            logger.info("[MEMU] ℹ️  记忆分类中没有可用摘要，未添加到提示词")
-    else:
-        logger.info("[MEMU] ℹ️  无记忆数据，使用基础系统提示词")
-    
-    return system_prompt
+    def stop_save_consumer(self) -> asyncio.Task:
+        """发送结束标记并让消费者保存剩余对话；可重复调用，始终返回同一个任务"""
+        if self.stop_task is None:
+            self.stop_task = asyncio.create_task(self._drain_save_consumer())
+        return self.stop_task
 
-def extract_categories(memories):
-    if not memories:
-        return []
-    if isinstance(memories, dict):
-        return memories.get('categories', []) or []
-    if hasattr(memories, 'categories'):
-        return getattr(memories, 'categories') or []
-    return []
+    async def _drain_save_consumer(self) -> None:
+        if self.save_consumer is not None:
+            await self.save_queue.put(SAVE_QUEUE_SENTINEL)
+            await self.save_consumer
+        # 关闭前正在进行的保存可能又启动了刷新任务
+        self.cancel_refresh_tasks()
 
-def extract_value(item, key):
-    return item.get(key) if isinstance(item, dict) else getattr(item, key, None)
+    async def aclose(self) -> None:
+        """任务关闭回调：等待剩余对话保存完成，再关闭本会话创建的 MemU HTTP 客户端"""
+        try:
+            await self.stop_save_consumer()
+        finally:
+            await self.http.aclose()
 
-async def save_conversation_to_memu(conversation: list, user_id: str, agent_id: str, assistant=None, base_instructions: str=None):
-    """
-    异步保存对话到 MemU 记忆系统
+
+# ============================================================================
+# AgentSession 事件处理（参考 https://docs.livekit.io/home/client/events/）
+# 模块级函数，所有会话共享；需要会话状态的处理函数以 SessionState 作为第一个参数
+# ============================================================================
+
+def on_agent_state_changed(state):
+    """当代理状态变化（listening/thinking/speaking 等）时触发"""
+    logger.info("[LiveKit] 🤖 Agent 状态变更 -> %s", state)
+
+def on_user_state_changed(state):
+    """当用户状态变化（listening/speaking 等）时触发"""
+    logger.info("[LiveKit] 👤 User 状态变更 -> %s", state)
+
+def on_user_input_transcribed(session_state: SessionState, payload):
+    """当用户语音被转写为文本时触发"""
+    if session_state.turns.user and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[MEMU] ⚠️ 覆盖上一条用户消息")
+    if logger.isEnabledFor(logging.INFO):
+        text = getattr(payload, "text", None) or getattr(payload, "transcript", None) or str(payload)
+        logger.info("[LiveKit] 📝 用户转写文本: %s", text)
+
+def on_conversation_item_added(session_state: SessionState, item):
+    """当对话消息加入历史记录时触发"""
     
-    参数:
-        conversation: 对话记录列表，格式为 [{"role": "user", "content": "..."}, ...]
-        user_id: 用户唯一标识符
-        agent_id: 代理唯一标识符
-    """
-    if not memu_client:
-        logger.warning("[MEMU] ⚠️  客户端未初始化，跳过对话保存")
+    # 检查 item 是否包含 'item' 属性，它是 ChatMessage 对象
+    chat_message = getattr(item, 'item', None)
+    if chat_message is None:
+        logger.warning("[LiveKit] item 中不包含 ChatMessage 对象，无法处理")
         return
+
+    # 获取消息的角色和内容；系统/工具等消息不参与保存，在任何文本处理之前直接跳过
+    role = getattr(chat_message, "role", "unknown")
+    if role not in ("user", "assistant"):
+        return
+    content = getattr(chat_message, "content", None)  # content 是一个列表
+
+    # 如果 content 是列表，将其中的文本合并为一个字符串
+    if isinstance(content, list):
+        content = content_to_text(content)
     
-    try:
-        # 记录保存的对话信息
-        message_count = len(conversation)
-        logger.info("[MEMU] 💾 开始保存对话到 MemU...")
-        logger.info(f"[MEMU]   用户 ID: {user_id}")
-        logger.info(f"[MEMU]   代理 ID: {agent_id}")
-        logger.info(f"[MEMU]   对话消息数: {message_count}")
-        
-        # 显示对话预览
-        for idx, msg in enumerate(conversation): # 显示全部 
-        # for idx, msg in enumerate(conversation[:4], 1):  # 只显示前4条
-            role = msg.get('role', 'unknown')
-            content_preview = msg.get('content', '')[:50] + '...' if len(msg.get('content', '')) > 50 else msg.get('content', '')
-            logger.info(f"[MEMU]   消息 {idx} ({role}): {content_preview}")
-        
-        # 在后台线程中执行同步的 API 调用
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: memu_client.memorize_conversation(
-                conversation=conversation,
-                user_id=user_id,
-                user_name="语音用户",
-                agent_id=agent_id,
-                agent_name="语音助手"
-            )
-        )
-        
-        # 记录保存结果
-        task_id = getattr(response, 'task_id', 'N/A')
-        logger.info(f"[MEMU] ✅ 对话已成功提交到 MemU")
-        logger.info(f"[MEMU]   任务 ID: {task_id}")
-        logger.info(f"[MEMU]   消息数: {message_count}")
-        if assistant and base_instructions:
-            asyncio.create_task(
-                refresh_memories_and_update_prompt_with_task(
-                    task_id,
-                    user_id,
-                    agent_id,
-                    assistant,
-                    base_instructions
-                )
-            )
+    # 调试输出：检查 content 是否为 None
+    if content is None:
+        logger.warning("[LiveKit] 内容为空 (None)，无法处理此消息，role=%s", role)
+    else:
+        logger.info("[LiveKit] 💬 conversation_item_added -> role=%s, content=%.100s", role, content)  # 只显示前100个字符
         
-    except Exception as error:
-        logger.error(f"[MEMU] ❌ 保存对话时发生错误: {error}")
-        logger.error(f"[MEMU]   错误类型: {type(error).__name__}")
-        import traceback
-        logger.error(f"[MEMU]   错误详情:\n{traceback.format_exc()}")
-
-async def refresh_memories_and_update_prompt_with_task(task_id: str, user_id: str, agent_id: str, assistant, base_instructions: str, attempts: int = 10, delay: float = 2.0):
-    if not memu_api_key:
-        return await refresh_memories_and_update_prompt_fallback(user_id, agent_id, assistant, base_instructions, attempts, delay)
-    for i in range(attempts):
-        try:
-            resp = requests.get(f"{MEMU_API_BASE}/memory/memorize/status/{task_id}", headers={"Authorization": f"Bearer {memu_api_key}"}, timeout=10)
-            status = resp.json() if resp.ok else None
-        except Exception:
-            status = None
-        if status == "completed":
-            memories = retrieve_user_memories(user_id, agent_id)
-            categories = extract_categories(memories)
-            summaries = [c for c in categories if extract_value(c, 'summary')]
-            if summaries:
-                updated = build_system_prompt_with_memories(base_instructions, memories)
-                assistant.instructions = updated
-                logger.info(f"[MEMU] 🔧 更新后的系统提示词: {updated}")
-                logger.info(f"[MEMU] ✅ 已刷新记忆并更新提示词，摘要条目: {len(summaries)}")
-                return
-        await asyncio.sleep(delay)
-    return await refresh_memories_and_update_prompt_fallback(user_id, agent_id, assistant, base_instructions, 5, delay)
-
-async def refresh_memories_and_update_prompt_fallback(user_id: str, agent_id: str, assistant, base_instructions: str, attempts: int, delay: float):
-    for i in range(attempts):
-        memories = retrieve_user_memories(user_id, agent_id)
-        categories = extract_categories(memories)
-        summaries = [c for c in categories if extract_value(c, 'summary')]
-        if summaries:
-            updated = build_system_prompt_with_memories(base_instructions, memories)
-            assistant.instructions = updated
-            logger.info(f"[MEMU] 🔧 更新后的系统提示词: {updated}")
-            logger.info(f"[MEMU] ✅ 已刷新记忆并更新提示词，摘要条目: {len(summaries)}")
-            return
-        await asyncio.sleep(delay)
-    logger.info("[MEMU] ℹ️  重试后仍无摘要，保持基础提示词")
+        # 如果内容非空，与此前的消息配对；凑成完整轮次后放入保存队列
+        if isinstance(content, str) and content and not content.isspace():
+            turns = session_state.turns
+            conversation_context = turns.add(role, content)
+            if conversation_context is not None:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[LiveKit] 新增对话轮次 %d, 用户: %.200r", turns.count, conversation_context[0]["content"])
+                try:
+                    session_state.save_queue.put_nowait(conversation_context)
+                except asyncio.QueueFull:
+                    logger.warning("[LiveKit] ⚠️  保存队列已满，丢弃本轮对话")
+
+def on_session_close(session_state: SessionState, reason=None):
+    """当 session 关闭时触发"""
+    logger.info("[LiveKit] ⛔ AgentSession closed. reason=%s", reason)
+    # 取消仍在轮询的记忆刷新任务，释放连接与线程
+    session_state.cancel_refresh_tasks()
+    # 会话结束时通知消费者保存剩余的对话；任务关闭回调会等待同一个任务完成
+    session_state.stop_save_consumer()
 
 
 # ============================================================================
@@ -237,12 +220,27 @@ async def refresh_memories_and_update_prompt_fallback(user_id: str, agent_id: st
 # ============================================================================
 
 class Assistant(Agent):
+    """
+    语音助手 Agent
+    
+    每个会话创建新实例，不做跨会话缓存：Agent 持有本会话的对话上下文（含注入的记忆消息）与运行中的
+    AgentActivity，同一实例不能同时服务两个会话。跨会话共享的只有驻留的 BASE_INSTRUCTIONS，构造本身只是几次属性赋值。
+    """
+
     def __init__(self, instructions: str = None) -> None:
-        super().__init__(instructions=instructions)
+        super().__init__(instructions=instructions or BASE_INSTRUCTIONS)
 
 server = AgentServer()
 
 
+def prewarm(proc: JobProcess):
+    """进程预热：加载一次 VAD 模型，供该进程内的所有会话共享"""
+    # ONNX Runtime 线程数有意保持插件默认（intra/inter-op 各 1），2 核虚拟机上加线程只会与事件循环争抢 CPU
+    proc.userdata["vad"] = silero.VAD.load()
+
+server.setup_fnc = prewarm
+
+
 @server.rtc_session()
 async def entrypoint(ctx: JobContext):
     # each log entry will include these fields
@@ -267,27 +265,22 @@ async def entrypoint(ctx: JobContext):
     logger.info(f"[MEMU]   用户 ID: {user_id}")
     logger.info(f"[MEMU]   代理 ID: {agent_id}")
     
-    # 检索用户历史记忆
+    # 在后台检索用户历史记忆，与会话初始化并行进行（VAD 模型已在进程预热时加载）
     logger.info("")
-    user_memories = retrieve_user_memories(user_id, agent_id)
+    memories_task = asyncio.create_task(aretrieve_user_memories(user_id, agent_id))
     
-    # 构建包含记忆的系统提示词
+    # 系统提示词固定为基础提示词，记忆到达后以独立消息注入对话上下文
     logger.info("")
-    logger.info("[MEMU] 🔨 构建系统提示词...")
-    base_instructions = """"""
-    logger.info(f"[MEMU] 🧭 基础系统提示词: {base_instructions}")
-    dynamic_instructions = build_system_prompt_with_memories(base_instructions, user_memories)
-    logger.info(f"[MEMU] 🔧 动态系统提示词: {dynamic_instructions}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[MEMU] 🧭 基础系统提示词(len=%d): %.200s", len(BASE_INSTRUCTIONS), BASE_INSTRUCTIONS)
     
-    # 创建带记忆的 Assistant 实例
-    logger.info("")
-    logger.info("[MEMU] 🤖 创建带记忆的 Assistant 实例")
-    assistant = Assistant(instructions=dynamic_instructions)
+    logger.info("[MEMU] 🤖 创建 Assistant 实例（记忆将在会话启动后注入）")
+    assistant = Assistant(instructions=BASE_INSTRUCTIONS)
     logger.info("[MEMU] ✅ Assistant 创建完成")
     logger.info("=" * 60)
     
     # ========================================================================
-    # 初始化 AgentSession
+    # 初始化 AgentSession（LLM/TTS 构造开销很小，同步创建即可）
     # ========================================================================
     session = AgentSession(
         # stt=inference.STT(
@@ -321,121 +314,32 @@ async def entrypoint(ctx: JobContext):
             api_key=api_key
         ),
         turn_detection="vad",
-        vad=silero.VAD.load(),
+        vad=ctx.proc.userdata["vad"],
+
+        # 在等待用户说完时提前生成回复；LLM 输出按句切分后流式送入 TTS（非流式 TTS 由 AgentSession 自动包装），
+        # 用户插话时未播放的语音会被取消
+        # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
+        preemptive_generation=True,
+
+        # 背景噪声造成的误打断被识别后，恢复播放被打断的语音
+        resume_false_interruption=True,
+        false_interruption_timeout=1.0,
     )
     
     # ========================================================================
     # MemU 记忆层集成：监听对话并保存
     # ========================================================================
-    conversation_buffer = []
-    full_conversation = []
-    turn_count = 0
-    current_user_message = None
-    current_agent_message = None
+    session_state = SessionState(user_id, agent_id)
+    # LiveKit 并发执行各关闭回调，保存剩余对话与关闭 HTTP 客户端放在同一个回调里按顺序进行
+    ctx.add_shutdown_callback(session_state.aclose)
     
-    # ========================================================================
-    # AgentSession 官方事件（参考 https://docs.livekit.io/home/client/events/）
-    # ========================================================================
     logger.info("")
     logger.info("[LiveKit] 📝 注册 AgentSession 事件监听器...")
-
-    @session.on("agent_state_changed")
-    def on_agent_state_changed(state):
-        """当代理状态变化（listening/thinking/speaking 等）时触发"""
-        logger.info(f"[LiveKit] 🤖 Agent 状态变更 -> {state}")
-
-    @session.on("user_state_changed")
-    def on_user_state_changed(state):
-        """当用户状态变化（listening/speaking 等）时触发"""
-        logger.info(f"[LiveKit] 👤 User 状态变更 -> {state}")
-
-    @session.on("user_input_transcribed")
-    def on_user_input_transcribed(payload):
-        """当用户语音被转写为文本时触发"""
-        text = getattr(payload, "text", None) or getattr(payload, "transcript", None) or str(payload)
-        current_user_message and logger.debug("[MEMU] ⚠️ 覆盖上一条用户消息")
-        logger.info(f"[LiveKit] 📝 用户转写文本: {text}")
-
-    @session.on("conversation_item_added")
-    def on_conversation_item_added(item):
-        """当对话消息加入历史记录时触发"""
-        
-        # 检查 item 是否包含 'item' 属性，它是 ChatMessage 对象
-        chat_message = getattr(item, 'item', None)
-        if chat_message is None:
-            logger.warning(f"[LiveKit] item 中不包含 ChatMessage 对象，无法处理")
-            return
-
-        # 获取消息的角色和内容
-        role = getattr(chat_message, "role", "unknown")
-        content = getattr(chat_message, "content", None)  # content 是一个列表
-
-        # 如果 content 是列表，将其合并为一个字符串
-        if isinstance(content, list):
-            content = ''.join(content)  # 合并列表中的所有文本内容
-        
-        # 调试输出：检查 content 是否为 None
-        if content is None:
-            logger.warning(f"[LiveKit] 内容为空 (None)，无法处理此消息，role={role}")
-        else:
-            logger.info(f"[LiveKit] 💬 conversation_item_added -> role={role}, content={content}")  # 只显示前100个字符
-            
-            # 如果内容非空，进行解析并输出
-            if isinstance(content, str) and content.strip():
-                if role == "user":
-                    # logger.info(f"用户提问: {content}")  # 显示用户问题
-                    nonlocal current_user_message
-                    current_user_message = content
-                elif role == "assistant":
-                    # logger.info(f"助手回答: {content}")  # 显示助手回答
-                    nonlocal current_agent_message, conversation_buffer, turn_count
-                    current_agent_message = content  # 赋值给 current_agent_message
-
-                    # 如果用户提问存在，保存对话并清空当前消息
-                    if current_user_message:
-                        turn_count += 1
-                        conversation_context = [
-                            {"role": "user", "content": current_user_message},
-                            {"role": "assistant", "content": current_agent_message}
-                        ]
-                        conversation_buffer.extend(conversation_context)
-                        full_conversation.extend(conversation_context)
-                        logger.debug(f"[LiveKit] 当前对话缓冲区内容: {conversation_buffer}")
-                        current_user_message = None
-                        current_agent_message = None
-
-                        if len(conversation_buffer) >= 4:
-                            logger.debug(f"[LiveKit] 缓冲区已满，准备保存对话到 MemU")
-                            asyncio.create_task(
-                                save_conversation_to_memu(
-                                    full_conversation.copy(),
-                                    user_id,
-                                    agent_id,
-                                    assistant,
-                                    base_instructions
-                                )
-                            )
-                            conversation_buffer.clear()
-                            
-
-
-    @session.on("close")
-    def on_session_close(reason=None):
-        """当 session 关闭时触发"""
-        logger.info(f"[LiveKit] ⛔ AgentSession closed. reason={reason}")
-        nonlocal conversation_buffer, full_conversation
-        if len(full_conversation) >= 4:
-            asyncio.create_task(
-                save_conversation_to_memu(
-                    full_conversation.copy(),
-                    user_id,
-                    agent_id,
-                    assistant,
-                    base_instructions
-                )
-            )
-            conversation_buffer.clear()
-            full_conversation.clear()
+    session.on("agent_state_changed", on_agent_state_changed)
+    session.on("user_state_changed", on_user_state_changed)
+    session.on("user_input_transcribed", functools.partial(on_user_input_transcribed, session_state))
+    session.on("conversation_item_added", functools.partial(on_conversation_item_added, session_state))
+    session.on("close", functools.partial(on_session_close, session_state))
     
     # ========================================================================
     # 启动对话会话
@@ -454,12 +358,21 @@ async def entrypoint(ctx: JobContext):
         ),
     )
     logger.info("[MEMU] ✅ AgentSession 启动完成")
-    logger.info("[MEMU] 📡 现在正在监听对话事件...")
+    # 会话启动成功后再启动保存消费者，启动失败时不会遗留无人停止的后台任务
+    session_state.start_save_consumer(assistant)
     
-
-    # await session.generate_reply(
-    #     instructions="对用户打招呼并且表达你的帮助"
-    # )
+    # 先打招呼，不等待记忆检索，首句响应延迟只取决于 LLM/TTS
+    session.generate_reply(
+        instructions="对用户打招呼并且表达你的帮助"
+    )
+    
+    # 等待记忆检索完成（不设超时：问候已在进行，这里的等待不阻塞任何响应），以独立的 system 消息注入一次
+    user_memories = await memories_task
+    memory_context = build_memory_context(user_memories)
+    if memory_context:
+        await inject_memory_context(assistant, memory_context)
+        logger.info("[MEMU] ✅ 记忆消息已注入对话上下文")
+    logger.info("[MEMU] 📡 现在正在监听对话事件...")
 
 
 if __name__ == "__main__":
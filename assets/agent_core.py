@@ -0,0 +1,293 @@
+"""
+早期语音助手脚本的公共实现
+
+agent_init.py（纯语音对话）与 agent_memu_0.1.py（带 MemU 记忆）共用这里的 Assistant、
+AgentSession 构造与入口流程，两者只是 AgentConfig 不同的薄封装。
+"""
+
+import logging
+import os
+import asyncio
+import concurrent.futures
+import functools
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+from livekit.agents import (
+    Agent,
+    AgentSession,
+    inference,
+    JobContext,
+    JobProcess,
+    room_io,
+)
+from livekit.plugins import silero
+from livekit.plugins import openai
+
+# uncomment to enable Krisp background voice/noise cancellation
+# from livekit.plugins import noise_cancellation
+
+logger = logging.getLogger("basic-agent")
+
+
+#OPENAI-API
+load_dotenv(override=True)
+api_key = os.getenv("OPENAI_APIKEY")
+base_url = os.getenv("BASE_URL")
+deepgram_api_key = os.getenv("DEEPGRAM_API_KEY")
+memu_key = os.getenv("MEMU_API_KEY")
+
+BASE_INSTRUCTIONS = """你是一个有用的语音人工智能助手。你热心地帮助用户解答他们的问题，从你广博的知识中提供信息。
+你的回答简洁明了，没有任何复杂的格式或标点符号，包括表情符号、星号或其他符号。你好奇、友善，而且有幽默感。"""
+
+
+@dataclass(frozen=True)
+class AgentConfig:
+    """
+    脚本配置
+
+    stt: "inference-nova2"（LiveKit Inference 的 deepgram/nova-2）、"openai-mini"（gpt-4o-mini-transcribe）
+         或 "deepgram-flux"（Deepgram flux-general-en）
+    llm_model: OpenAI 兼容接口的模型名
+    enable_memu: 是否检索记忆并在每轮对话结束后保存到 MemU
+    """
+    stt: str = "inference-nova2"
+    llm_model: str = "gpt-5"
+    enable_memu: bool = False
+    user_id: str = "user_123"
+    agent_id: str = "assistant_001"
+
+
+# ============================================================================
+# MemU（仅 enable_memu 时使用，客户端首次使用时创建）
+# ============================================================================
+
+# MemU 同步调用专用线程池：检索与保存各用一个，保存较慢，不占用检索线程
+_MEMU_EXEC = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="memu")
+_MEMU_SAVE_EXEC = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="memu-save")
+
+@functools.cache
+def _memu():
+    from memu import MemuClient
+
+    return MemuClient(
+        base_url="https://api.memu.so",
+        api_key=memu_key
+    )
+
+# retrieve user memories
+def retrieve_user_memories(user_id, agent_id):
+    try:
+        memories = _memu().retrieve_default_categories(
+            user_id=user_id,
+            agent_id=agent_id
+        )
+        print('Retrieved memories:', memories)
+        return memories
+    except Exception as error:
+        print('Error retrieving memories:', error)
+        return None
+
+# build context from memories (the SDK returns a pydantic model, so use attribute access)
+def build_system_prompt(memories, base_prompt):
+    parts = [base_prompt, "\n\nHere's what you know about the user:\n\n"]
+
+    if memories and memories.categories:
+        parts.extend(
+            f"**{category.name}:** {category.summary}\n\n"
+            for category in memories.categories
+            if category.summary
+        )
+
+    return "".join(parts)
+
+# save conversation to memory (synchronous)
+def save_conversation_sync(conversation, user_id, agent_id):
+    try:
+        response = _memu().memorize_conversation(
+            conversation=conversation,
+            user_id=user_id,
+            user_name="Demo User",
+            agent_id=agent_id,
+            agent_name="AI Assistant"
+        )
+        print('Conversation saved! Task ID:', response.task_id)
+    except Exception as error:
+        print('Error saving conversation:', error)
+
+# async wrapper to run the save in a background thread
+async def save_conversation_async(conversation, user_id, agent_id):
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(
+            _MEMU_SAVE_EXEC,
+            save_conversation_sync,
+            conversation,
+            user_id,
+            agent_id
+        )
+    except Exception as error:
+        print(f'Error saving conversation in background: {error}')
+
+
+# ============================================================================
+# Assistant 与 AgentSession
+# ============================================================================
+
+class Assistant(Agent):
+    def __init__(self, instructions: str = None) -> None:
+        super().__init__(instructions=instructions or BASE_INSTRUCTIONS)
+
+
+def make_stt(name: str):
+    """按 AgentConfig.stt 创建语音转写（STT）实例"""
+    if name == "inference-nova2":
+        return inference.STT(
+            model="deepgram/nova-2",
+            language="zh"
+        )
+    if name == "openai-mini":
+        return openai.STT(
+            model="gpt-4o-mini-transcribe",
+            base_url=base_url,
+            api_key=api_key,
+            language="zh"
+        )
+    if name == "deepgram-flux":
+        # 仅此配置需要 Deepgram 插件，按需导入
+        from livekit.plugins import deepgram
+
+        return deepgram.STTv2(
+            model="flux-general-en",
+            eager_eot_threshold=0.4,
+            api_key=deepgram_api_key
+        )
+    raise ValueError(f"未知的 STT 配置: {name}")
+
+
+def make_session(cfg: AgentConfig, vad) -> AgentSession:
+    """
+    按配置创建 AgentSession
+
+    参数:
+        cfg: 脚本配置
+        vad: 进程预热时加载的 VAD 模型
+    """
+    return AgentSession(
+        # Speech-to-text (STT) is your agent's ears, turning the user's speech into text that the LLM can understand
+        # See all available models at https://docs.livekit.io/agents/models/stt/
+        stt=make_stt(cfg.stt),
+        # A Large Language Model (LLM) is your agent's brain, processing user input and generating a response
+        # See all available models at https://docs.livekit.io/agents/models/llm/
+        llm=openai.LLM(
+            model=cfg.llm_model,
+            base_url=base_url,
+            api_key=api_key
+        ),
+        # Text-to-speech (TTS) is your agent's voice, turning the LLM's text into speech that the user can hear
+        # See all available models as well as voice selections at https://docs.livekit.io/agents/models/tts/
+        tts=openai.TTS(
+            model="gpt-4o-mini-tts",
+            voice="ash",
+            instructions="用友好和对话的语气说话",
+            base_url=base_url,
+            api_key=api_key
+        ),
+
+        # VAD and turn detection are used to determine when the user is speaking and when the agent should respond
+        # See more at https://docs.livekit.io/agents/build/turns
+        # turn_detection=MultilingualModel(),
+        turn_detection="vad",
+        vad=vad,
+
+        # allow the LLM to generate a response while waiting for the end of turn
+        # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
+        # preemptive_generation=True,
+
+        # sometimes background noise could interrupt the agent session, these are considered false positive interruptions
+        # # when it's detected, you may resume the agent's speech
+        # resume_false_interruption=True,
+        # false_interruption_timeout=1.0,
+    )
+
+
+def prewarm(proc: JobProcess):
+    """进程预热：加载一次 VAD 模型，供该进程内的所有会话共享"""
+    proc.userdata["vad"] = silero.VAD.load()
+
+
+async def run_entrypoint(ctx: JobContext, cfg: AgentConfig):
+    """
+    会话入口：（可选）检索记忆、创建 AgentSession 并启动对话
+
+    参数:
+        ctx: LiveKit 任务上下文
+        cfg: 脚本配置
+    """
+    # each log entry will include these fields
+    ctx.log_context_fields = {
+        "room": ctx.room.name,
+    }
+
+    instructions = BASE_INSTRUCTIONS
+    if cfg.enable_memu:
+        # Retrieve user memories and build dynamic system prompt with memories
+        loop = asyncio.get_running_loop()
+        user_memories = await loop.run_in_executor(_MEMU_EXEC, retrieve_user_memories, cfg.user_id, cfg.agent_id)
+        instructions = build_system_prompt(user_memories, BASE_INSTRUCTIONS)
+
+    session = make_session(cfg, ctx.proc.userdata["vad"])
+
+    if cfg.enable_memu:
+        # AgentSession 没有 turn_finished 事件：改为监听 conversation_item_added，
+        # 把用户消息与随后的助手回复配对成一轮再保存
+        # (EventEmitter 不接受协程回调，在同步回调中创建后台任务)
+        pending_user_text = None
+
+        @session.on("conversation_item_added")
+        def on_conversation_item_added(event):
+            nonlocal pending_user_text
+            item = event.item
+            role = getattr(item, "role", None)
+            if role not in ("user", "assistant"):
+                return
+            text = item.text_content
+            if not text or text.isspace():
+                return
+            if role == "user":
+                pending_user_text = text
+                return
+
+            # We only want to save turns where the user and the agent both spoke
+            if pending_user_text is None:
+                return
+
+            # Build the conversation context for saving
+            conversation_context = [
+                {"role": "user", "content": pending_user_text},
+                {"role": "assistant", "content": text}
+            ]
+            pending_user_text = None
+
+            # Save the conversation in the background
+            asyncio.create_task(
+                save_conversation_async(conversation_context, cfg.user_id, cfg.agent_id)
+            )
+
+    #启动对话
+    await session.start(
+        agent=Assistant(instructions=instructions),
+        room=ctx.room,
+        room_options=room_io.RoomOptions(
+            audio_input=room_io.AudioInputOptions(
+                # uncomment to enable the Krisp BVC noise cancellation
+                # noise_cancellation=noise_cancellation.BVC(),
+                # noise_cancellation=lambda params:krisp.BVCTelephony() if params.participant.kind == rtc.ParticipantKind.PARTICIPANT_KIND_SIP else krisp.BVC()
+            ),
+        ),
+    )
+
+    await session.generate_reply(
+        instructions="对用户打招呼并且表达你的帮助"
+    )
@@ -18,6 +18,7 @@ from livekit.agents import (
     MetricsCollectedEvent,
     RunContext,
     cli,
+    llm,
     metrics,
     room_io,
     voice,
@@ -60,6 +61,12 @@ else:
 # print(api_key)
 # print(base_url)
 
+# 基础系统提示词：模块级常量并驻留，所有会话共享同一对象
+BASE_INSTRUCTIONS = sys.intern(
+    """你是一个有用的语音人工智能助手。你热心地帮助用户解答他们的问题，从你广博的知识中提供信息。
+你的回答简洁明了，没有任何复杂的格式或标点符号，包括表情符号、星号或其他符号。你好奇、友善，而且有幽默感。"""
+)
+
 
 # ============================================================================
 # MemU 记忆层功能函数
@@ -74,11 +81,11 @@ def retrieve_user_memories(user_id: str, agent_id: str):
         agent_id: 代理唯一标识符
     
     返回:
-        dict: 包含记忆分类的字典，如果失败则返回空字典
+        DefaultCategoriesResponse | None: SDK 返回的记忆分类（pydantic 模型），失败时返回 None
     """
     if not memu_client:
         logger.warning("[MEMU] ⚠️  客户端未初始化，跳过记忆检索")
-        return {'categories': []}
+        return None
     
     try:
         logger.info("[MEMU] 🔍 开始检索用户记忆...")
@@ -90,15 +97,14 @@ def retrieve_user_memories(user_id: str, agent_id: str):
             agent_id=agent_id
         )
         
-        # 详细记录检索结果
-        if memories and 'categories' in memories:
-            category_count = len(memories['categories'])
+        # 详细记录检索结果（SDK 返回 pydantic 模型，按属性访问）
+        if memories and memories.categories:
+            category_count = len(memories.categories)
             logger.info(f"[MEMU] ✅ 成功检索到 {category_count} 个记忆分类")
             
-            for idx, category in enumerate(memories['categories'], 1):
-                category_name = category.get('name', '未知分类')
-                has_summary = bool(category.get('summary'))
-                summary_preview = category.get('summary', '')[:50] + '...' if category.get('summary') else '无摘要'
+            for idx, category in enumerate(memories.categories, 1):
+                category_name = category.name or '未知分类'
+                summary_preview = category.summary[:50] + '...' if category.summary else '无摘要'
                 logger.info(f"[MEMU]   分类 {idx}: {category_name} (摘要: {summary_preview})")
         else:
             logger.info("[MEMU] ℹ️  未找到历史记忆（新用户或首次对话）")
@@ -107,49 +113,40 @@ def retrieve_user_memories(user_id: str, agent_id: str):
     except Exception as error:
         logger.error(f"[MEMU] ❌ 检索记忆时发生错误: {error}")
         logger.error(f"[MEMU]   错误类型: {type(error).__name__}")
-        return {'categories': []}
+        return None
 
 
-def build_system_prompt_with_memories(base_instructions: str, memories: dict) -> str:
+def build_memory_context(memories) -> str:
     """
-    将记忆信息整合到系统提示词中
+    将记忆信息整理为独立的记忆消息文本（不拼接到系统提示词，保持系统提示词前缀跨会话一致）
     
     参数:
-        base_instructions: 基础系统提示词
-        memories: 从 MemU 检索的记忆字典
+        memories: retrieve_user_memories 的返回值（DefaultCategoriesResponse 或 None）
     
     返回:
-        str: 包含记忆信息的完整系统提示词
+        str: 记忆消息文本，无可用摘要时返回空字符串
     """
-    system_prompt = base_instructions
-    memory_added = False
-    
-    # 如果有记忆，添加到提示词中
-    if memories and 'categories' in memories:
-        memory_context = "\n\n以下是关于用户的信息：\n\n"
-        added_categories = 0
-        
-        for category in memories['categories']:
-            if category.get('summary'):
-                category_name = category.get('name', '未知分类')
-                category_summary = category['summary']
-                memory_context += f"**{category_name}:** {category_summary}\n\n"
-                added_categories += 1
-        
-        if added_categories > 0:
-            system_prompt += memory_context
-            memory_added = True
-            logger.info(f"[MEMU] 📝 已将 {added_categories} 个记忆分类添加到系统提示词")
-            logger.info(f"[MEMU]   提示词总长度: {len(system_prompt)} 字符")
-        else:
-            logger.info("[MEMU] ℹ️  记忆分类中没有可用摘要，未添加到提示词")
-    else:
+    if not (memories and memories.categories):
         logger.info("[MEMU] ℹ️  无记忆数据，使用基础系统提示词")
+        return ""
+    
+    parts = ["以下是关于用户的信息：\n\n"]
+    added_categories = 0
+    
+    for category in memories.categories:
+        if category.summary:
+            category_name = category.name or '未知分类'
+            parts.append(f"**{category_name}:** {category.summary}\n\n")
+            added_categories += 1
     
-    if not memory_added:
-        logger.info("[MEMU] ⚠️  系统提示词中未包含记忆信息（将使用基础提示词）")
+    if added_categories == 0:
+        logger.info("[MEMU] ℹ️  记忆分类中没有可用摘要，未生成记忆消息")
+        return ""
     
-    return system_prompt
+    memory_context = "".join(parts)
+    logger.info(f"[MEMU] 📝 已将 {added_categories} 个记忆分类整理为记忆消息")
+    logger.info(f"[MEMU]   记忆消息长度: {len(memory_context)} 字符")
+    return memory_context
 
 
 async def save_conversation_to_memu(conversation: list, user_id: str, agent_id: str):
@@ -209,17 +206,51 @@ async def save_conversation_to_memu(conversation: list, user_id: str, agent_id:
 # Assistant 类
 # ============================================================================
 
+def install_debug_event_logger(session):
+    """
+    包装 session.emit，以一个入口记录会话发出的所有事件
+    （AgentSession 的事件发射器不支持通配符监听，逐个事件名注册监听器既不完整也有额外分发开销）
+    
+    参数:
+        session: AgentSession 实例
+    
+    返回:
+        callable: 调用后恢复原始的 emit
+    """
+    original_emit = session.emit
+
+    def emit(event, *args, **kwargs):
+        logger.debug("[MEMU] 🔔 事件 '%s' 被触发！", event)
+        if args:
+            logger.debug("[MEMU]   参数类型: %s", type(args[0]).__name__)
+            text = getattr(args[0], 'text', None) or getattr(args[0], 'transcript', None)
+            if isinstance(text, str):
+                logger.debug("[MEMU]   文本内容: %s", text[:100])
+        return original_emit(event, *args, **kwargs)
+
+    session.emit = emit
+
+    def uninstall():
+        # 删除实例属性后 session.emit 重新解析为类上的方法
+        session.__dict__.pop("emit", None)
+
+    return uninstall
+
+
 class Assistant(Agent):
-    def __init__(self, instructions: str = None) -> None:
-        base_instructions = """你是一个有用的语音人工智能助手。你热心地帮助用户解答他们的问题，从你广博的知识中提供信息。
-            你的回答简洁明了，没有任何复杂的格式或标点符号，包括表情符号、星号或其他符号。你好奇、友善，而且有幽默感。"""
-        
-        final_instructions = instructions if instructions else base_instructions
-        super().__init__(instructions=final_instructions)
+    def __init__(self, instructions: str = None, chat_ctx: llm.ChatContext = None) -> None:
+        super().__init__(instructions=instructions or BASE_INSTRUCTIONS, chat_ctx=chat_ctx)
 
 server = AgentServer()
 
 
+def prewarm(proc: JobProcess):
+    """进程预热：加载一次 VAD 模型，供该进程内的所有会话共享"""
+    proc.userdata["vad"] = silero.VAD.load()
+
+server.setup_fnc = prewarm
+
+
 @server.rtc_session()
 async def entrypoint(ctx: JobContext):
     # each log entry will include these fields
@@ -248,17 +279,18 @@ async def entrypoint(ctx: JobContext):
     logger.info("")
     user_memories = retrieve_user_memories(user_id, agent_id)
     
-    # 构建包含记忆的系统提示词
+    # 记忆作为独立的 system 消息放入初始对话上下文，系统提示词保持为 BASE_INSTRUCTIONS
     logger.info("")
-    logger.info("[MEMU] 🔨 构建系统提示词...")
-    base_instructions = """你是一个有用的语音人工智能助手。你热心地帮助用户解答他们的问题，从你广博的知识中提供信息。
-            你的回答简洁明了，没有任何复杂的格式或标点符号，包括表情符号、星号或其他符号。你好奇、友善，而且有幽默感。"""
-    dynamic_instructions = build_system_prompt_with_memories(base_instructions, user_memories)
+    logger.info("[MEMU] 🔨 构建记忆消息...")
+    chat_ctx = llm.ChatContext()
+    memory_context = build_memory_context(user_memories)
+    if memory_context:
+        chat_ctx.add_message(role="system", content=memory_context)
     
     # 创建带记忆的 Assistant 实例
     logger.info("")
     logger.info("[MEMU] 🤖 创建带记忆的 Assistant 实例")
-    assistant = Assistant(instructions=dynamic_instructions)
+    assistant = Assistant(chat_ctx=chat_ctx)
     logger.info("[MEMU] ✅ Assistant 创建完成")
     logger.info("=" * 60)
     
@@ -298,7 +330,7 @@ async def entrypoint(ctx: JobContext):
         # See more at https://docs.livekit.io/agents/build/turns
         # turn_detection=MultilingualModel(),
         turn_detection="vad",
-        vad=silero.VAD.load(),
+        vad=ctx.proc.userdata["vad"],
 
         # allow the LLM to generate a response while waiting for the end of turn
         # See more at https://docs.livekit.io/agents/build/audio/#preemptive-generation
@@ -327,19 +359,21 @@ async def entrypoint(ctx: JobContext):
     @session.on("agent_state_changed")
     def on_agent_state_changed(state):
         """当代理状态变化（listening/thinking/speaking 等）时触发"""
-        logger.info(f"[LiveKit] 🤖 Agent 状态变更 -> {state}")
+        logger.info("[LiveKit] 🤖 Agent 状态变更 -> %s", state)
 
     @session.on("user_state_changed")
     def on_user_state_changed(state):
         """当用户状态变化（listening/speaking 等）时触发"""
-        logger.info(f"[LiveKit] 👤 User 状态变更 -> {state}")
+        logger.info("[LiveKit] 👤 User 状态变更 -> %s", state)
 
     @session.on("user_input_transcribed")
     def on_user_input_transcribed(payload):
         """当用户语音被转写为文本时触发"""
-        text = getattr(payload, "text", None) or getattr(payload, "transcript", None) or str(payload)
-        current_user_message and logger.debug("[MEMU] ⚠️ 覆盖上一条用户消息")
-        logger.info(f"[LiveKit] 📝 用户转写文本: {text}")
+        if current_user_message and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[MEMU] ⚠️ 覆盖上一条用户消息")
+        if logger.isEnabledFor(logging.INFO):
+            text = getattr(payload, "text", None) or getattr(payload, "transcript", None) or str(payload)
+            logger.info("[LiveKit] 📝 用户转写文本: %s", text)
 
     @session.on("conversation_item_added")
     def on_conversation_item_added(item):
@@ -348,11 +382,13 @@ async def entrypoint(ctx: JobContext):
         # 检查 item 是否包含 'item' 属性，它是 ChatMessage 对象
         chat_message = getattr(item, 'item', None)
         if chat_message is None:
-            logger.warning(f"[LiveKit] item 中不包含 ChatMessage 对象，无法处理")
+            logger.warning("[LiveKit] item 中不包含 ChatMessage 对象，无法处理")
             return
 
-        # 获取消息的角色和内容
+        # 获取消息的角色和内容；系统/工具等消息不参与保存，在任何文本处理之前直接跳过
         role = getattr(chat_message, "role", "unknown")
+        if role not in ("user", "assistant"):
+            return
         content = getattr(chat_message, "content", None)  # content 是一个列表
 
         # # 获取消息的角色和内容
@@ -361,18 +397,18 @@ async def entrypoint(ctx: JobContext):
         
         # 调试输出：检查 content 是否为 None
         if content is None:
-            logger.warning(f"[LiveKit] 内容为空 (None)，无法处理此消息，role={role}")
+            logger.warning("[LiveKit] 内容为空 (None)，无法处理此消息，role=%s", role)
         else:
-            logger.info(f"[LiveKit] 💬 conversation_item_added -> role={role}, content={content}")  # 只显示前100个字符
+            logger.info("[LiveKit] 💬 conversation_item_added -> role=%s, content=%.100s", role, content)  # 只显示前100个字符
             
             # 如果内容非空，进行解析并输出
-            if isinstance(content, str) and content.strip():
+            if isinstance(content, str) and content and not content.isspace():
                 if role == "user":
-                    logger.info(f"用户提问: {content}")  # 显示用户问题
+                    logger.info("用户提问: %s", content)  # 显示用户问题
                     nonlocal current_user_message
                     current_user_message = content
                 elif role == "assistant":
-                    logger.info(f"助手回答: {content}")  # 显示助手回答
+                    logger.info("助手回答: %s", content)  # 显示助手回答
                     nonlocal current_agent_message, conversation_buffer, turn_count
                     current_agent_message = content  # 赋值给 current_agent_message
 
@@ -388,21 +424,28 @@ async def entrypoint(ctx: JobContext):
                         current_agent_message = None
 
                         # 每当积累到4条对话后，保存对话
+                        # 直接移交当前缓冲区并换上新列表，避免每次保存都复制一份
                         if len(conversation_buffer) >= 2:
+                            batch, conversation_buffer = conversation_buffer, []
                             asyncio.create_task(
                                 save_conversation_to_memu(
-                                    conversation_buffer.copy(),
+                                    batch,
                                     user_id,
                                     agent_id
                                 )
                             )
-                            conversation_buffer.clear()
 
 
+    # 调试事件日志的清理函数，会话关闭时调用，避免同一 worker 进程内跨会话泄漏
+    debug_cleanups = []
+    
     @session.on("close")
     def on_session_close(reason=None):
         """当 session 关闭时触发"""
-        logger.info(f"[LiveKit] ⛔ AgentSession closed. reason={reason}")
+        logger.info("[LiveKit] ⛔ AgentSession closed. reason=%s", reason)
+        for cleanup in debug_cleanups:
+            cleanup()
+        debug_cleanups.clear()
     
     # ========================================================================
     # 启动对话会话
@@ -423,35 +466,11 @@ async def entrypoint(ctx: JobContext):
     logger.info("[MEMU] ✅ AgentSession 启动完成")
     logger.info("[MEMU] 📡 现在正在监听对话事件...")
     
-    # 调试：列出 session 对象的所有可用事件
-    try:
-        if hasattr(session, '_event_emitter'):
-            emitter = session._event_emitter
-            if hasattr(emitter, '_listeners'):
-                events = list(emitter._listeners.keys())
-                logger.info(f"[MEMU] 🔍 可用事件列表: {events}")
-    except Exception as e:
-        logger.debug(f"[MEMU] 无法列出事件: {e}")
-    
-    # 尝试监听所有可能的 transcript 相关事件
-    possible_events = [
-        "user_transcript", "agent_transcript", "transcript",
-        "user_speech", "agent_speech", "speech",
-        "user_message", "agent_message", "message"
-    ]
-    
-    for event_name in possible_events:
-        try:
-            @session.on(event_name)
-            def debug_event_handler(*args, **kwargs):
-                logger.info(f"[MEMU] 🔔 事件 '{event_name}' 被触发！")
-                logger.info(f"[MEMU]   参数数量: {len(args)}, 关键字参数: {list(kwargs.keys())}")
-                if args:
-                    logger.info(f"[MEMU]   第一个参数类型: {type(args[0]).__name__}")
-                    if hasattr(args[0], 'text'):
-                        logger.info(f"[MEMU]   文本内容: {args[0].text[:100]}")
-        except Exception as e:
-            logger.debug(f"[MEMU] 无法注册事件 '{event_name}': {e}")
+    # 调试：记录会话发出的所有事件
+    # 仅在 DEBUG 日志级别且设置了 MEMU_DEBUG_EVENTS 环境变量时启用，生产环境不做任何包装
+    if logger.isEnabledFor(logging.DEBUG) and os.getenv("MEMU_DEBUG_EVENTS"):
+        debug_cleanups.append(install_debug_event_logger(session))
+        logger.debug("[MEMU] 🔍 已启用事件调试日志")
 
     await session.generate_reply(
         instructions="对用户打招呼并且表达你的帮助"
@@ -225,6 +225,11 @@ def save_conversation(conversation, user_id, agent_id):
     except Exception as error:
         print('❌ Error saving conversation:', error)
 
+# 轮询退避参数：首次 0.2 秒后检查，每次间隔乘以 1.5，最长 2 秒
+POLL_INITIAL_DELAY = 0.2
+POLL_BACKOFF = 1.5
+POLL_MAX_DELAY = 2.0
+
 def wait_for_completion(task_id):
     """
     轮询检查 MemU 记忆处理任务的状态，直到完成
@@ -233,7 +238,7 @@ def wait_for_completion(task_id):
         task_id (str): 从 save_conversation 返回的任务 ID
     
     功能说明:
-        - 定期查询任务状态（每 2 秒一次）
+        - 按指数退避查询任务状态（0.2 秒起，每次 ×1.5，最长 2 秒），快速完成的任务能更早被发现
         - 当任务状态为 SUCCESS、FAILURE 或 REVOKED 时停止轮询
         - 确保记忆处理完成后再继续后续操作
     
@@ -243,6 +248,7 @@ def wait_for_completion(task_id):
         - REVOKED: 任务被取消
         - 其他状态: 仍在处理中，继续等待
     """
+    delay = POLL_INITIAL_DELAY
     while True:
         try:
             # 查询任务当前状态
@@ -253,8 +259,9 @@ def wait_for_completion(task_id):
             if status.status in ['SUCCESS', 'FAILURE', 'REVOKED']:
                 break
             
-            # 等待 2 秒后再次检查状态
-            time.sleep(2)
+            # 退避等待后再次检查状态
+            time.sleep(delay)
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
         except Exception as error:
             print('❌ Error checking task status:', error)
             break
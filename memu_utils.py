@@ -0,0 +1,463 @@
+"""
+MemU 记忆层工具模块
+
+集中管理 MemU 客户端初始化、记忆检索（带 TTL 缓存）、记忆消息注入、对话保存与记忆刷新，
+供 agent.py 导入使用，避免在多个入口脚本中重复实现。
+"""
+
+import logging
+import os
+import asyncio
+import atexit
+import concurrent.futures
+import functools
+import threading
+from collections import deque
+from datetime import datetime
+import httpx
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from memu import MemuClient
+
+try:
+    import orjson  # 可选：用于直接向 MemU 提交对话时序列化请求体
+except ImportError:
+    orjson = None
+
+try:
+    import h2  # 可选：httpx 的 HTTP/2 支持（pip install "httpx[http2]"）
+except ImportError:
+    h2 = None
+
+logger = logging.getLogger("guma-agent")
+
+load_dotenv(override=True)
+memu_api_key = os.getenv("MEMU_API_KEY")  # MemU API 密钥
+MEMU_API_BASE = "https://api.memu.so/api/v1"
+
+# 初始化 MemU 客户端
+if memu_api_key:
+    memu_client = MemuClient(
+        base_url="https://api.memu.so",
+        api_key=memu_api_key
+    )
+    logger.info("[MEMU] ✅ MemU 客户端初始化成功")
+else:
+    memu_client = None
+    logger.warning("[MEMU] ⚠️  MemU API 密钥未设置，记忆功能将被禁用")
+
+# MemU 同步 SDK 调用专用线程池，与默认线程池（LiveKit 等共用）隔离
+MEMU_POOL_SIZE = max(1, int(os.getenv("MEMU_POOL_SIZE", "8")))
+_MEMU_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MEMU_POOL_SIZE,
+    thread_name_prefix="memu"
+)
+atexit.register(_MEMU_POOL.shutdown, wait=False)
+
+# 对话保存（SDK 回退路径）使用单独的线程池：保存请求较慢，不与记忆检索争用线程。
+# 线程池由进程内所有会话共享，在线程执行器下跨多个事件循环也能限制并发，
+# 不能用绑定单个事件循环的 asyncio.Semaphore
+MEMU_SAVE_CONCURRENCY = max(1, MEMU_POOL_SIZE // 2)
+_MEMU_SAVE_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MEMU_SAVE_CONCURRENCY,
+    thread_name_prefix="memu-save"
+)
+atexit.register(_MEMU_SAVE_POOL.shutdown, wait=False)
+
+# 匿名/默认用户：不可能有有效记忆，跳过检索与保存
+ANONYMOUS_USER_IDS = frozenset({"default_user"})
+ANONYMOUS_USER_PREFIX = "anon-"
+
+# 记忆以独立的 system 消息注入对话上下文，使用固定 ID 以便刷新时替换
+MEMORY_MESSAGE_ID = "memu_memories"
+
+# 记忆检索缓存：按 (user_id, agent_id) 缓存检索结果，TTL 内的重连与轮询直接复用
+MEMU_CACHE_TTL = 60  # 秒
+_MEMU_CACHE = TTLCache(maxsize=1024, ttl=MEMU_CACHE_TTL)
+_MEMU_CACHE_LOCK = threading.Lock()  # 检索在线程池中执行，TTLCache 本身非线程安全
+
+# 对话提交与记忆任务状态轮询：每个会话一个 httpx 异步客户端（new_http_client 创建，会话结束时关闭）与指数退避上限
+MEMU_POLL_MAX_DELAY = 16.0  # 秒
+MEMU_MEMORIZE_TIMEOUT = 10.0  # 直接提交对话的请求超时（秒）
+# 这些状态码说明服务端未接受直接提交的请求（路径、方法或请求体不兼容），可以安全地改用 SDK 重新提交
+MEMU_FALLBACK_STATUS_CODES = frozenset({404, 405, 415, 422})
+if h2 is None:
+    logger.info("[MEMU] ℹ️  未安装 h2，MemU HTTP 客户端使用 HTTP/1.1")
+
+# 对话批量保存：每累积 SAVE_EVERY_TURNS 轮对话提交一次增量，会话结束时提交剩余部分
+SAVE_EVERY_TURNS = 10
+SAVE_IDLE_FLUSH_SECONDS = 30.0  # 对话空闲超过该时长时提前提交未保存部分，避免进程异常退出丢失整段对话
+SAVE_QUEUE_SENTINEL = object()  # 放入保存队列表示会话结束
+SAVE_PENDING_MAX = 512  # 待提交消息数上限，MemU 长时间不可用时丢弃最早的消息，限制内存占用
+
+
+# ============================================================================
+# MemU 记忆层功能函数
+# ============================================================================
+def _preview(text: str, limit: int = 50) -> str:
+    """截取日志预览文本，超出长度时追加省略号"""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def is_anonymous_user(user_id: str) -> bool:
+    """判断是否为匿名/默认用户"""
+    return not user_id or user_id in ANONYMOUS_USER_IDS or user_id.startswith(ANONYMOUS_USER_PREFIX)
+
+def invalidate_memory_cache(user_id: str, agent_id: str):
+    """移除指定用户/代理的记忆缓存，保存或记忆更新后调用，避免下次检索读到旧摘要"""
+    with _MEMU_CACHE_LOCK:
+        _MEMU_CACHE.pop((user_id, agent_id), None)
+
+def retrieve_user_memories(user_id: str, agent_id: str, force: bool = False):
+    """
+    从 MemU 检索用户的历史记忆（带 TTL 缓存）
+    参数:
+        user_id: 用户唯一标识符
+        agent_id: 代理唯一标识符
+        force: 为 True 时跳过缓存，直接请求 MemU
+    返回:
+        tuple[tuple[str, str], ...]: 有摘要的记忆分类 (名称, 摘要) 元组，跳过或失败时返回空元组
+    """
+    if not memu_client:
+        logger.warning("[MEMU] ⚠️  客户端未初始化，跳过记忆检索")
+        return ()
+    if is_anonymous_user(user_id):
+        logger.info(f"[MEMU] ℹ️  匿名用户，跳过记忆检索 (用户 ID: {user_id})")
+        return ()
+    
+    cache_key = (user_id, agent_id)
+    if not force:
+        with _MEMU_CACHE_LOCK:
+            cached = _MEMU_CACHE.get(cache_key)
+        if cached is not None:
+            logger.info(f"[MEMU] ♻️  命中记忆缓存，跳过 MemU 请求 (用户 ID: {user_id})")
+            return cached
+    
+    try:
+        logger.info("[MEMU] 🔍 开始检索用户记忆...")
+        logger.info(f"[MEMU]   用户 ID: {user_id}")
+        logger.info(f"[MEMU]   代理 ID: {agent_id}")
+        
+        memories = memu_client.retrieve_default_categories(
+            user_id=user_id,
+            agent_id=agent_id
+        )
+        categories = extract_categories(memories)
+        if categories:
+            category_count = len(categories)
+            logger.info(f"[MEMU] ✅ 成功检索到 {category_count} 个记忆分类")
+            if logger.isEnabledFor(logging.INFO):
+                for idx, category in enumerate(categories, 1):
+                    category_name = extract_value(category, 'name') or '未知分类'
+                    summary_val = extract_value(category, 'summary')
+                    summary_preview = _preview(summary_val) if summary_val else '无摘要'
+                    logger.info(f"[MEMU]   分类 {idx}: {category_name} (摘要: {summary_preview})")
+        else:
+            logger.info("[MEMU] ℹ️  未找到历史记忆（新用户或首次对话）")
+        
+        summaries = _normalize_memories(categories)
+        with _MEMU_CACHE_LOCK:
+            _MEMU_CACHE[cache_key] = summaries
+        return summaries
+    except Exception as error:
+        logger.error(f"[MEMU] ❌ 检索记忆时发生错误: {error}")
+        logger.error(f"[MEMU]   错误类型: {type(error).__name__}")
+        return ()
+
+
+async def aretrieve_user_memories(user_id: str, agent_id: str, force: bool = False):
+    """retrieve_user_memories 的异步版本：在线程池中执行同步的 MemU 调用，不阻塞事件循环"""
+    if is_anonymous_user(user_id):
+        return retrieve_user_memories(user_id, agent_id, force)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_MEMU_POOL, retrieve_user_memories, user_id, agent_id, force)
+
+
+def build_memory_context(summaries: tuple) -> str:
+    """
+    将记忆信息整理为独立的记忆消息文本（不拼接到系统提示词，保持系统提示词前缀跨会话一致）
+    
+    参数:
+        summaries: retrieve_user_memories 返回的 (名称, 摘要) 元组
+    
+    返回:
+        str: 记忆消息文本，无可用摘要时返回空字符串
+    """
+    if not summaries:
+        logger.info("[MEMU] ℹ️  无可用记忆摘要，使用基础系统提示词")
+        return ""
+    
+    memory_context = _render_memory_context(summaries)
+    logger.info(f"[MEMU] 📝 已将 {len(summaries)} 个记忆分类整理为记忆消息")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[MEMU] memory_context(len=%d): %.200s", len(memory_context), memory_context)
+    return memory_context
+
+@functools.lru_cache(maxsize=256)
+def _render_memory_context(summaries: tuple) -> str:
+    """拼接记忆消息文本；摘要未变化时（缓存命中、轮询刷新）直接复用已生成的字符串"""
+    parts = ["以下是关于用户的信息：\n\n"]
+    parts.extend(f"**{category_name}:** {category_summary}\n\n" for category_name, category_summary in summaries)
+    return "".join(parts)
+
+async def inject_memory_context(assistant, memory_context: str):
+    """
+    以独立的 system 消息将记忆注入 Assistant 的对话上下文；已有记忆消息时替换之
+    
+    参数:
+        assistant: 目标 Assistant 实例
+        memory_context: build_memory_context 生成的记忆消息文本
+    """
+    chat_ctx = assistant.chat_ctx.copy()
+    if chat_ctx.get_by_id(MEMORY_MESSAGE_ID) is not None:
+        chat_ctx.remove(MEMORY_MESSAGE_ID)
+    chat_ctx.add_message(role="system", content=memory_context, id=MEMORY_MESSAGE_ID)
+    await assistant.update_chat_ctx(chat_ctx)
+
+def extract_categories(memories):
+    if not memories:
+        return []
+    if isinstance(memories, dict):
+        return memories.get('categories', []) or []
+    if hasattr(memories, 'categories'):
+        return getattr(memories, 'categories') or []
+    return []
+
+def extract_value(item, key):
+    return item.get(key) if isinstance(item, dict) else getattr(item, key, None)
+
+def _normalize_memories(categories) -> tuple:
+    """将记忆分类一次性规整为 (名称, 摘要) 元组，只保留有摘要的分类；不可变且可哈希，可安全共享缓存"""
+    summaries = []
+    for category in categories:
+        category_summary = extract_value(category, 'summary')
+        if category_summary:
+            summaries.append((extract_value(category, 'name') or '未知分类', category_summary))
+    return tuple(summaries)
+
+async def _memorize_conversation(conversation: list, user_id: str, agent_id: str, http: httpx.AsyncClient = None) -> str | None:
+    """
+    提交对话到 MemU 的记忆任务接口
+    
+    安装了 orjson 且传入了会话的 HTTP 客户端时，用 orjson 序列化请求体直接提交，不占用线程池；
+    不满足上述条件，或服务端确定未接收请求（连接失败、404/405/415/422）时，回退到 SDK 的同步调用（在线程池中执行）。
+    读超时、5xx 等服务端可能已创建任务的错误直接抛出，由调用方稍后重试，避免同一段对话被重复提交。
+    
+    返回:
+        str | None: 记忆任务 ID；请求已被接受但响应中无法解析任务 ID 时为 None
+    """
+    if orjson is not None and http is not None:
+        try:
+            body = orjson.dumps({
+                "conversation": conversation,
+                "user_id": user_id,
+                "user_name": "语音用户",
+                "agent_id": agent_id,
+                "agent_name": "语音助手",
+                "session_date": datetime.now().astimezone().isoformat(),
+            })
+            resp = await http.post(
+                "/memory/memorize",
+                content=body,
+                headers={"Content-Type": "application/json"},
+                timeout=MEMU_MEMORIZE_TIMEOUT
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout) as error:
+            # 连接未建立，请求一定没有发出
+            logger.warning(f"[MEMU] ⚠️  直接提交对话连接失败，回退到 SDK: {error}")
+        else:
+            if resp.status_code in MEMU_FALLBACK_STATUS_CODES:
+                logger.warning(f"[MEMU] ⚠️  直接提交对话被拒绝 (HTTP {resp.status_code})，回退到 SDK")
+            else:
+                resp.raise_for_status()
+                try:
+                    return orjson.loads(resp.content)["task_id"]
+                except (orjson.JSONDecodeError, KeyError, TypeError) as error:
+                    # 请求已被接受，不能再次提交；只是无法跟踪任务状态
+                    logger.warning(f"[MEMU] ⚠️  无法解析记忆任务 ID: {error}")
+                    return None
+    
+    # 在保存专用线程池中执行同步的 API 调用，并发数受其线程数限制
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(
+        _MEMU_SAVE_POOL,
+        lambda: memu_client.memorize_conversation(
+            conversation=conversation,
+            user_id=user_id,
+            user_name="语音用户",
+            agent_id=agent_id,
+            agent_name="语音助手"
+        )
+    )
+    return getattr(response, 'task_id', 'N/A')
+
+async def save_conversation_to_memu(conversation: list, user_id: str, agent_id: str, assistant=None, refresh_tasks: set = None, http: httpx.AsyncClient = None):
+    """
+    异步保存对话到 MemU 记忆系统
+    
+    参数:
+        conversation: 对话记录列表，格式为 [{"role": "user", "content": "..."}, ...]
+        user_id: 用户唯一标识符
+        agent_id: 代理唯一标识符
+        assistant: 可选，提交成功后刷新该 Assistant 的记忆消息
+        refresh_tasks: 可选，记录后台刷新任务的集合，会话关闭时据此取消
+        http: 可选，本会话的 MemU HTTP 客户端（new_http_client 创建），用于直接提交与任务状态轮询
+    返回:
+        bool: 对话是否已提交（或无需提交），失败时返回 False 以便调用方稍后重试
+    """
+    if not memu_client:
+        logger.warning("[MEMU] ⚠️  客户端未初始化，跳过对话保存")
+        return True
+    if is_anonymous_user(user_id):
+        logger.info(f"[MEMU] ℹ️  匿名用户，跳过对话保存 (用户 ID: {user_id})")
+        return True
+    
+    try:
+        # 记录保存的对话信息
+        message_count = len(conversation)
+        logger.info("[MEMU] 💾 开始保存对话到 MemU...")
+        logger.info(f"[MEMU]   用户 ID: {user_id}")
+        logger.info(f"[MEMU]   代理 ID: {agent_id}")
+        logger.info(f"[MEMU]   对话消息数: {message_count}")
+        
+        # 显示对话预览
+        if logger.isEnabledFor(logging.INFO):
+            for idx, msg in enumerate(conversation): # 显示全部 
+            # for idx, msg in enumerate(conversation[:4], 1):  # 只显示前4条
+                role = msg.get('role', 'unknown')
+                logger.info(f"[MEMU]   消息 {idx} ({role}): {_preview(msg.get('content', ''))}")
+        
+        task_id = await _memorize_conversation(conversation, user_id, agent_id, http)
+        
+        # 记录保存结果
+        logger.info(f"[MEMU] ✅ 对话已成功提交到 MemU")
+        logger.info(f"[MEMU]   任务 ID: {task_id}")
+        logger.info(f"[MEMU]   消息数: {message_count}")
+        # 新对话已提交，缓存中的摘要可能过期（尤其是会话结束时不再轮询任务状态的最后一次保存）
+        invalidate_memory_cache(user_id, agent_id)
+        if assistant and task_id:
+            refresh_task = asyncio.create_task(
+                refresh_memories_and_update_prompt_with_task(
+                    task_id,
+                    user_id,
+                    agent_id,
+                    assistant,
+                    http
+                )
+            )
+            if refresh_tasks is not None:
+                refresh_tasks.add(refresh_task)
+                refresh_task.add_done_callback(refresh_tasks.discard)
+        return True
+        
+    except Exception as error:
+        logger.error(f"[MEMU] ❌ 保存对话时发生错误: {error}")
+        logger.error(f"[MEMU]   错误类型: {type(error).__name__}")
+        import traceback
+        logger.error(f"[MEMU]   错误详情:\n{traceback.format_exc()}")
+        return False
+
+async def memu_save_consumer(queue: asyncio.Queue, user_id: str, agent_id: str, assistant=None, refresh_tasks: set = None, http: httpx.AsyncClient = None):
+    """
+    会话级保存消费者：从队列读取对话轮次，在本地累积尚未提交的消息，按窗口提交互不重叠的增量；
+    同一时刻最多只有一个保存请求在进行，提交失败的部分会并入下一次提交；
+    累积超过 SAVE_PENDING_MAX 条时丢弃最早的消息并记录警告
+    
+    参数:
+        queue: 对话轮次队列，每项为一轮 [user, assistant] 消息列表，SAVE_QUEUE_SENTINEL 表示结束
+        user_id: 用户唯一标识符
+        agent_id: 代理唯一标识符
+        assistant: 可选，提交成功后刷新该 Assistant 的记忆消息
+        refresh_tasks: 可选，记录后台刷新任务的集合，会话关闭时据此取消
+        http: 可选，本会话的 MemU HTTP 客户端
+    """
+    pending = deque(maxlen=SAVE_PENDING_MAX)  # 尚未成功提交的消息，已提交的部分不再保留
+
+    async def flush(assistant=None, refresh_tasks=None):
+        chunk = list(pending)
+        if await save_conversation_to_memu(chunk, user_id, agent_id, assistant, refresh_tasks, http):
+            # 保存期间只有本消费者会追加消息，按已提交的条数从队首移除
+            for _ in range(len(chunk)):
+                pending.popleft()
+
+    while True:
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout=SAVE_IDLE_FLUSH_SECONDS)
+        except asyncio.TimeoutError:
+            # 对话空闲，提前提交已累积但未保存的部分
+            if pending:
+                await flush(assistant, refresh_tasks)
+            continue
+        if item is SAVE_QUEUE_SENTINEL:
+            break
+        dropped = len(pending) + len(item) - SAVE_PENDING_MAX
+        if dropped > 0:
+            logger.warning(f"[MEMU] ⚠️  未提交的消息超过上限 {SAVE_PENDING_MAX} 条，丢弃最早的 {dropped} 条")
+        pending.extend(item)
+        # 每轮对话为 2 条消息
+        if len(pending) >= SAVE_EVERY_TURNS * 2:
+            await flush(assistant, refresh_tasks)
+    # 会话已结束，剩余对话只保存、不再刷新记忆消息
+    if pending:
+        await flush()
+
+def new_http_client() -> httpx.AsyncClient:
+    """
+    创建 MemU HTTP 客户端（安装了 h2 时使用 HTTP/2，会话内的提交与轮询复用同一连接）
+    
+    每个会话各自创建并在会话结束时关闭：LiveKit 的线程执行器下同一进程内的多个任务各有事件循环，
+    客户端不能跨事件循环共享
+    """
+    return httpx.AsyncClient(
+        base_url=MEMU_API_BASE,
+        headers={"Authorization": f"Bearer {memu_api_key}"},
+        http2=h2 is not None,
+        timeout=5.0
+    )
+
+def parse_task_status(body) -> str:
+    """从状态接口的响应体中提取小写的任务状态，兼容直接返回字符串与 {"status": ...} 两种格式"""
+    if isinstance(body, dict):
+        body = body.get('status')
+    return body.lower() if isinstance(body, str) else ''
+
+async def refresh_memories_and_update_prompt_with_task(task_id: str, user_id: str, agent_id: str, assistant, http: httpx.AsyncClient = None, attempts: int = 10, delay: float = 1.0):
+    if not memu_api_key or http is None:
+        return await refresh_memories_and_update_prompt_fallback(user_id, agent_id, assistant, attempts, delay)
+    initial_delay = delay
+    try:
+        for i in range(attempts):
+            try:
+                resp = await http.get(f"/memory/memorize/status/{task_id}")
+                status = parse_task_status(resp.json()) if resp.status_code == 200 else None
+            except Exception as error:
+                logger.warning(f"[MEMU] ⚠️  查询记忆任务状态失败 (任务 ID: {task_id}): {type(error).__name__}: {error}")
+                status = None
+            if status in ("completed", "success"):
+                # 任务完成后记忆已更新，使缓存失效以便本次检索命中 API
+                invalidate_memory_cache(user_id, agent_id)
+                summaries = await aretrieve_user_memories(user_id, agent_id)
+                if summaries:
+                    await inject_memory_context(assistant, build_memory_context(summaries))
+                    logger.info(f"[MEMU] ✅ 已刷新记忆消息，摘要条目: {len(summaries)}")
+                    return
+                break
+            if status in ("failed", "failure", "revoked"):
+                logger.warning(f"[MEMU] ⚠️  记忆任务失败，停止轮询 (任务 ID: {task_id}, 状态: {status})")
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MEMU_POLL_MAX_DELAY)
+        return await refresh_memories_and_update_prompt_fallback(user_id, agent_id, assistant, 5, initial_delay)
+    except asyncio.CancelledError:
+        logger.info(f"[MEMU] ⏹️  会话已关闭，取消记忆刷新 (任务 ID: {task_id})")
+        raise
+
+async def refresh_memories_and_update_prompt_fallback(user_id: str, agent_id: str, assistant, attempts: int, delay: float):
+    for _ in range(attempts):
+        # 每次探测都强制请求 MemU：缓存中的空结果正是要等待其变化的旧值
+        summaries = await aretrieve_user_memories(user_id, agent_id, force=True)
+        if summaries:
+            await inject_memory_context(assistant, build_memory_context(summaries))
+            logger.info(f"[MEMU] ✅ 已刷新记忆消息，摘要条目: {len(summaries)}")
+            return
+        await asyncio.sleep(delay)
+    logger.info("[MEMU] ℹ️  重试后仍无摘要，不注入记忆消息")